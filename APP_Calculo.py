@@ -1,14 +1,28 @@
+import functools
 import math
+import os
 import re
+
+import numpy as np
 import streamlit as st
 
+from _kernels import find_k
+
 try:
     import periodictable as pt
 except ImportError:
     pt = None
 
+# Perfilado opcional para desarrollo: con PROFILE=1 (y 'streamlit-profiler'
+# instalado) se mide cada ejecución y el informe se muestra en la página.
+_Profiler = None
+if os.getenv("PROFILE"):
+    from streamlit_profiler import Profiler as _Profiler
+
 AVOGADRO = 6.02214076e23  # mol^-1
 
+_PT_MISSING = "Falta la librería 'periodictable'. Instálala con: pip install periodictable"
+
 # ===========================
 # Utilidades
 # ===========================
@@ -16,147 +30,155 @@ AVOGADRO = 6.02214076e23  # mol^-1
 class FormulaParseError(Exception):
     pass
 
-def get_atomic_weight(symbol: str) -> float:
+# Masas atómicas de toda la tabla periódica: se construyen una sola vez por
+# servidor y las comparten todas las sesiones. Quien necesite varias masas
+# debe pedir el dict una vez y pasarlo a get_atomic_weight.
+@st.cache_resource(show_spinner=False)
+def _atomic_weights() -> dict:
     if pt is None:
-        raise RuntimeError("Falta la librería 'periodictable'. Instálala con: pip install periodictable")
-    if symbol == "D":  # deuterio (opcional)
-        return 2.01410177812
+        raise RuntimeError(_PT_MISSING)
+    weights = {el.symbol: float(el.mass) for el in pt.elements if el.symbol}
+    weights["D"] = 2.01410177812  # deuterio (opcional)
+    weights["T"] = float(pt.T.mass)  # tritio (opcional)
+    return weights
+
+def get_atomic_weight(symbol: str, weights: dict = None) -> float:
+    if weights is None:
+        weights = _atomic_weights()
     try:
-        el = getattr(pt, symbol)
-        return float(el.mass)
-    except Exception:
+        return weights[symbol]
+    except KeyError:
         raise FormulaParseError(f"Símbolo químico desconocido: '{symbol}'. Verifica mayúsculas/minúsculas (ej: 'Na', no 'NA').")
 
+# Cada alternativa empieza por un carácter distinto y ninguna puede
+# retroceder, así que 're' ya recorre la fórmula en tiempo lineal. Los
+# espacios se consumen antes de cada token, dentro del mismo patrón.
 _token_pat = re.compile(r"""
-    (?P<dot>[\.\·])|
-    (?P<lparen>[\(\[\{])|
-    (?P<rparen>[\)\]\}])|
-    (?P<number>\d+)|
-    (?P<elem>[A-Z][a-z]?)|
-    (?P<space>\s+)
+    \s*
+    (?:
+        (?P<dot>[\.\·])|
+        (?P<lparen>[\(\[\{])|
+        (?P<rparen>[\)\]\}])|
+        (?P<number>\d+)|
+        (?P<elem>[A-Z][a-z]?)
+    )
 """, re.VERBOSE)
 
 def tokenize(formula: str):
     pos = 0
-    while pos < len(formula):
-        m = _token_pat.match(formula, pos)
-        if not m:
-            raise FormulaParseError(f"Revisa la fórmula: hay un símbolo no reconocido cerca de '{formula[pos:pos+5]}'.")
+    for m in _token_pat.finditer(formula):
+        if m.start() != pos:
+            break
         pos = m.end()
         kind = m.lastgroup
-        val = m.group(m.lastgroup)
-        if kind != "space":
-            yield (kind, val)
-
-def multiply_counts(counts, k):
-    return {el: cnt * k for el, cnt in counts.items()}
-
-def merge_counts(a, b):
-    out = dict(a)
-    for el, cnt in b.items():
-        out[el] = out.get(el, 0) + cnt
-    return out
+        yield (kind, m.group(kind))
+    rest = formula[pos:].lstrip()
+    if rest:
+        raise FormulaParseError(f"Revisa la fórmula: hay un símbolo no reconocido cerca de '{rest[:5]}'.")
 
 def parse_formula(formula: str) -> dict:
-    tokens = list(tokenize(formula))
-    i = 0
-    def parse_unit():
-        nonlocal i
-        counts = {}
-        while i < len(tokens):
-            kind, val = tokens[i]
-            if kind == "rparen":
-                break
-            if kind == "dot":
-                i += 1
-                right = parse_unit()
-                counts.update(merge_counts(counts, right))
-                break
-            elif kind == "elem":
-                i += 1
-                el = val
-                mult = 1
-                if i < len(tokens) and tokens[i][0] == "number":
-                    mult = int(tokens[i][1]); i += 1
-                counts[el] = counts.get(el, 0) + mult
-            elif kind == "lparen":
-                i += 1
-                inner = parse_unit()
-                if i >= len(tokens) or tokens[i][0] != "rparen":
-                    raise FormulaParseError("Falta cerrar un paréntesis.")
-                i += 1
-                mult = 1
-                if i < len(tokens) and tokens[i][0] == "number":
-                    mult = int(tokens[i][1]); i += 1
-                inner = multiply_counts(inner, mult)
-                counts = merge_counts(counts, inner)
-            elif kind == "number":
-                mult = int(val); i += 1
-                if i >= len(tokens) or tokens[i][0] not in ("elem", "lparen"):
-                    raise FormulaParseError("Hay un número sin un elemento o grupo después.")
-                if tokens[i][0] == "elem":
-                    _, el = tokens[i]; i += 1
-                    cnt = 1
-                    if i < len(tokens) and tokens[i][0] == "number":
-                        cnt = int(tokens[i][1]); i += 1
-                    counts[el] = counts.get(el, 0) + mult * cnt
-                else:
-                    i += 1
-                    inner = parse_unit()
-                    if i >= len(tokens) or tokens[i][0] != "rparen":
-                        raise FormulaParseError("Falta cerrar un paréntesis tras el número.")
-                    i += 1
-                    cnt = 1
-                    if i < len(tokens) and tokens[i][0] == "number":
-                        cnt = int(tokens[i][1]); i += 1
-                    inner = multiply_counts(inner, mult * cnt)
-                    counts = merge_counts(counts, inner)
+    # La gramática solo necesita mirar un token hacia adelante (`peek`), así
+    # que los tokens se consumen directamente del generador.
+    tokens = tokenize(formula)
+    peek = next(tokens, None)
+    # Cada aparición de un elemento se guarda en dos listas paralelas
+    # (símbolo, cantidad). Al cerrar un paréntesis basta con multiplicar en su
+    # lugar las cantidades desde donde empezó el grupo; el dict se arma al final.
+    symbols = []
+    counts = []
+    group_starts = []  # índice en `counts` donde empieza cada grupo abierto
+    group_coefs = []  # coeficiente antepuesto a cada grupo abierto (None si no hay)
+    while peek is not None:
+        kind, val = peek
+        peek = next(tokens, None)
+        if kind == "elem":
+            mult = 1
+            if peek is not None and peek[0] == "number":
+                mult = int(peek[1]); peek = next(tokens, None)
+            symbols.append(val); counts.append(mult)
+        elif kind == "lparen":
+            group_starts.append(len(counts))
+            group_coefs.append(None)
+        elif kind == "rparen":
+            if not group_starts:
+                raise FormulaParseError("Sobra un paréntesis de cierre.")
+            start = group_starts.pop()
+            coef = group_coefs.pop()
+            mult = 1 if coef is None else coef
+            if peek is not None and peek[0] == "number":
+                mult *= int(peek[1]); peek = next(tokens, None)
+            if mult != 1:
+                for j in range(start, len(counts)):
+                    counts[j] *= mult
+        elif kind == "number":
+            mult = int(val)
+            if peek is None or peek[0] not in ("elem", "lparen"):
+                raise FormulaParseError("Hay un número sin un elemento o grupo después.")
+            kind, val = peek
+            peek = next(tokens, None)
+            if kind == "elem":
+                cnt = 1
+                if peek is not None and peek[0] == "number":
+                    cnt = int(peek[1]); peek = next(tokens, None)
+                symbols.append(val); counts.append(mult * cnt)
             else:
-                i += 1
-        return counts
-    total = parse_unit()
-    if i < len(tokens) and tokens[i][0] == "rparen":
-        raise FormulaParseError("Sobra un paréntesis de cierre.")
+                group_starts.append(len(counts))
+                group_coefs.append(mult)
+        # "dot" (hidratos, ej: CuSO4·5H2O) solo separa partes de la fórmula
+    if group_starts:
+        if group_coefs[-1] is not None:
+            raise FormulaParseError("Falta cerrar un paréntesis tras el número.")
+        raise FormulaParseError("Falta cerrar un paréntesis.")
+    total = {}
+    for el, n in zip(symbols, counts):
+        total[el] = total.get(el, 0) + n
     return total
 
-def molar_mass(formula: str) -> float:
+# Conteos, masa molar y aporte en masa de cada elemento, en una sola pasada.
+def _composition(formula: str):
     counts = parse_formula(formula)
-    return sum(get_atomic_weight(el) * n for el, n in counts.items())
+    weights = _atomic_weights()
+    per_element = {el: get_atomic_weight(el, weights) * n for el, n in counts.items()}
+    total_mm = math.fsum(per_element.values())
+    return counts, total_mm, per_element
+
+# Masas molares de las fórmulas de ejemplo del panel lateral, ya calculadas
+# (se llena junto a EXAMPLES, ver _example_molar_masses).
+_PRECOMPUTED_MM = {}
+
+def molar_mass(formula: str) -> float:
+    mm = _PRECOMPUTED_MM.get(formula)
+    if mm is None:
+        _, mm, _ = _composition(formula)
+    return mm
 
 def percent_composition(formula: str):
-    counts = parse_formula(formula)
-    total_mm = molar_mass(formula)
-    comp = {el: 100.0 * get_atomic_weight(el) * n / total_mm for el, n in counts.items()}
+    _, total_mm, per_element = _composition(formula)
+    comp = {el: 100.0 * m / total_mm for el, m in per_element.items()}
     return comp, total_mm
 
 def empirical_formula_from_pairs(pairs, tolerance=0.05):
-    total = sum(m for _, m in pairs)
+    total = math.fsum(m for _, m in pairs)
     base100 = 95.0 <= total <= 105.0
+    weights = _atomic_weights()
     moles = []
     for sym, val in pairs:
-        mm = get_atomic_weight(sym)
+        mm = get_atomic_weight(sym, weights)
         grams = val if not base100 else val  # base 100 g si son %
         moles.append((sym, grams / mm))
     minmol = min(v for _, v in moles if v > 0)
     ratios = [(sym, v / minmol) for sym, v in moles]
-    for k in [1, 2, 3, 4, 5, 6, 8, 10]:
-        ok = True; rounded = []
-        for sym, r in ratios:
-            x = r * k; n = round(x)
-            if n == 0 or abs(x - n) > tolerance:
-                ok = False; break
-            rounded.append((sym, n))
-        if ok:
-            counts = {}
-            for sym, n in rounded:
-                counts[sym] = counts.get(sym, 0) + n
-            return format_formula(counts)
+    k, rounded = find_k(np.asarray([r for _, r in ratios], dtype=np.float64), tolerance)
+    if k:
+        counts = {}
+        for (sym, _), n in zip(ratios, rounded):
+            counts[sym] = counts.get(sym, 0) + int(n)
+        return format_formula(counts)
     counts = {sym: max(1, int(round(r))) for sym, r in ratios}
     return format_formula(counts)
 
 def molecular_formula(empirical_formula: str, target_molar_mass: float):
-    emp_counts = parse_formula(empirical_formula)
-    emp_mm = sum(get_atomic_weight(el) * n for el, n in emp_counts.items())
+    emp_counts, emp_mm, _ = _composition(empirical_formula)
     ratio = target_molar_mass / emp_mm
     k = int(round(ratio))
     if k <= 0 or abs(ratio - k) > 0.03:
@@ -165,16 +187,14 @@ def molecular_formula(empirical_formula: str, target_molar_mass: float):
         emp_counts[el] *= k
     return format_formula(emp_counts)
 
+# Orden de Hill: primero C, luego H y el resto alfabéticamente.
+_HILL_ORDER = {"C": 0, "H": 1}
+
 def format_formula(counts: dict) -> str:
-    def order_key(item):
-        el, _ = item
-        if el == "C": return (0, el)
-        if el == "H": return (1, el)
-        return (2, el)
-    parts = []
-    for el, n in sorted(counts.items(), key=order_key):
-        parts.append(f"{el}{'' if n==1 else n}")
-    return "".join(parts)
+    return "".join(
+        (f"{el}{n}" if n != 1 else el)
+        for el, n in sorted(counts.items(), key=lambda it: (_HILL_ORDER.get(it[0], 2), it[0]))
+    )
 
 # ===========================
 # Contenidos Didácticos
@@ -197,14 +217,32 @@ EXAMPLES = {
     "Fosfato de calcio": "Ca3(PO4)2",
 }
 
+# Sin spinner, así que puede llamarse antes de st.set_page_config.
+@st.cache_resource(show_spinner=False)
+def _example_molar_masses() -> dict:
+    return {f: _composition(f)[1] for f in EXAMPLES.values()}
+
+if pt is not None:
+    _PRECOMPUTED_MM.update(_example_molar_masses())
+
 # ===========================
 # UI
 # ===========================
 
-st.set_page_config(page_title="Química para principiantes", page_icon="🧪", layout="centered")
+# Las ejecuciones completas se miden de principio a fin (el try/finally detiene
+# el perfilador aunque la ejecución se corte por un error o porque Streamlit la
+# interrumpe); las de una sola pestaña se miden dentro del fragmento (ver
+# _profile_fragment).
+_profiler = None
+if _Profiler is not None:
+    _profiler = _Profiler()
+    _profiler.start()
+
+try:
+    st.set_page_config(page_title="Química para principiantes", page_icon="🧪", layout="centered")
 
-st.title("🧪 Química para principiantes: moles, masas y fórmulas")
-st.markdown("""
+    st.title("🧪 Química para principiantes: moles, masas y fórmulas")
+    st.markdown("""
 ### 👩‍🏫 By *Grupo 2* — Javier Vargas e Italo Lazcano
 
 Esta herramienta **te guía paso a paso** para resolver ejercicios de:
@@ -216,240 +254,317 @@ Esta herramienta **te guía paso a paso** para resolver ejercicios de:
 ---
 """)
 
-with st.sidebar:
-    st.header("📚 Glosario rápido")
-    for k, v in GLOSARIO.items():
-        with st.expander(k):
-            st.write(v)
-    st.divider()
-    st.subheader("🧪 Ejemplos de fórmulas")
-    for name, f in EXAMPLES.items():
-        if st.button(f"Usar {name}", key=f"ex_{name}"):
-            st.session_state["last_formula"] = f
-    st.caption("Consejo: las letras respetan mayúsculas/minúsculas (Na ≠ NA).")
-
-tabs = st.tabs(["👣 Modo guiado", "🧮 Cálculos rápidos", "⚖️ Masa molar y %", "🧩 Empírica y molecular", "📘 Ejemplos resueltos"])
-
-# ---------- Tab 1: Modo guiado ----------
-with tabs[0]:
-    st.subheader("👣 Paso a paso")
-    step = st.radio("¿Qué necesitas?", [
-        "¿Qué es un mol? (moles ↔ partículas)",
-        "Gramos ↔ Moles (con una fórmula)",
-        "Calcular masa molar y % composición",
-        "Fórmula empírica desde % o masas",
-        "Fórmula molecular desde empírica + masa molar"
-    ])
-
-    if step == "¿Qué es un mol? (moles ↔ partículas)":
-        st.info("**Idea clave:** 1 mol = 6,022×10²³ partículas (Número de Avogadro).")
-        op = st.selectbox("Elige conversión:", ["Moles → Partículas", "Partículas → Moles"])
-        if op == "Moles → Partículas":
-            n = st.number_input("¿Cuántos moles?", min_value=0.0, value=1.0)
-            if st.button("Calcular", key="g1"):
-                p = n * AVOGADRO
-                st.latex(r"N_{\text{partículas}} = n \times N_A")
-                st.success(f"Resultado: **{p:.3e} partículas**")
-                st.caption("Multiplicamos los moles por el Número de Avogadro.")
-        else:
-            p = st.number_input("¿Cuántas partículas?", min_value=0.0, value=AVOGADRO)
-            if st.button("Calcular", key="g2"):
-                n = p / AVOGADRO
-                st.latex(r"n = \dfrac{N_{\text{partículas}}}{N_A}")
-                st.success(f"Resultado: **{n:.6f} mol**")
-                st.caption("Dividimos las partículas por el Número de Avogadro.")
-
-    if step == "Gramos ↔ Moles (con una fórmula)":
-        formula = st.text_input("Escribe la fórmula química (ej: H2O, C6H12O6)", st.session_state.get("last_formula","H2O"))
-        op2 = st.selectbox("Elige conversión:", ["Gramos → Moles", "Moles → Gramos"])
-        if op2 == "Gramos → Moles":
+    # La fórmula con la que se trabaja es una sola para todas las pestañas: se
+    # escribe en un único campo fuera de ellas (key="formula") y los ejemplos del
+    # panel lateral la reemplazan. Las pestañas solo la leen.
+    st.session_state.setdefault("formula", "H2O")
+
+    def _shared_formula():
+        formula = st.session_state["formula"]
+        st.caption(f"Fórmula en uso: **{formula}** (se cambia en el campo sobre las pestañas)")
+        return formula
+
+    # Con PROFILE activo, una pestaña que se vuelve a ejecutar sola (sin el resto
+    # de la página) se mide por separado y muestra su propio informe.
+    def _profile_fragment(fn):
+        if _Profiler is None:
+            return fn
+        @functools.wraps(fn)
+        def wrapper():
+            if _profiler is not None:  # ya se mide la ejecución completa
+                return fn()
+            with _Profiler():
+                return fn()
+        return wrapper
+
+    # Si se vuelve a pedir el mismo cálculo con las mismas entradas (ej: pulsar
+    # "Calcular" otra vez) se reutiliza el último resultado de la sesión.
+    def _session_memo(fn, *args):
+        key = (fn.__name__, args)
+        if st.session_state.get("_last_computed_key") != key:
+            st.session_state["_last_computed"] = fn(*args)
+            st.session_state["_last_computed_key"] = key
+        return st.session_state["_last_computed"]
+
+    with st.sidebar:
+        st.header("📚 Glosario rápido")
+        for k, v in GLOSARIO.items():
+            with st.expander(k):
+                st.write(v)
+        st.divider()
+        st.subheader("🧪 Ejemplos de fórmulas")
+        for name, f in EXAMPLES.items():
+            if st.button(f"Usar {name}", key=f"ex_{name}"):
+                st.session_state["formula"] = f
+        st.caption("Consejo: las letras respetan mayúsculas/minúsculas (Na ≠ NA).")
+
+    # Fuera de los fragmentos: al editarla se vuelve a ejecutar toda la página.
+    st.text_input("Fórmula química (ej: H2O, C6H12O6, CuSO4·5H2O)", key="formula")
+
+    tabs = st.tabs(["👣 Modo guiado", "🧮 Cálculos rápidos", "⚖️ Masa molar y %", "🧩 Empírica y molecular", "📘 Ejemplos resueltos"])
+
+    # ---------- Tab 1: Modo guiado ----------
+    @st.fragment
+    @_profile_fragment
+    def _tab_guided():
+        st.subheader("👣 Paso a paso")
+        step = st.radio("¿Qué necesitas?", [
+            "¿Qué es un mol? (moles ↔ partículas)",
+            "Gramos ↔ Moles (con una fórmula)",
+            "Calcular masa molar y % composición",
+            "Fórmula empírica desde % o masas",
+            "Fórmula molecular desde empírica + masa molar"
+        ])
+
+        if step == "¿Qué es un mol? (moles ↔ partículas)":
+            st.info("**Idea clave:** 1 mol = 6,022×10²³ partículas (Número de Avogadro).")
+            op = st.selectbox("Elige conversión:", ["Moles → Partículas", "Partículas → Moles"])
+            if op == "Moles → Partículas":
+                n = st.number_input("¿Cuántos moles?", min_value=0.0, value=1.0)
+                if st.button("Calcular", key="g1"):
+                    p = n * AVOGADRO
+                    st.latex(r"N_{\text{partículas}} = n \times N_A")
+                    st.success(f"Resultado: **{p:.3e} partículas**")
+                    st.caption("Multiplicamos los moles por el Número de Avogadro.")
+            else:
+                p = st.number_input("¿Cuántas partículas?", min_value=0.0, value=AVOGADRO)
+                if st.button("Calcular", key="g2"):
+                    n = p / AVOGADRO
+                    st.latex(r"n = \dfrac{N_{\text{partículas}}}{N_A}")
+                    st.success(f"Resultado: **{n:.6f} mol**")
+                    st.caption("Dividimos las partículas por el Número de Avogadro.")
+
+        if step == "Gramos ↔ Moles (con una fórmula)":
+            formula = _shared_formula()
+            op2 = st.selectbox("Elige conversión:", ["Gramos → Moles", "Moles → Gramos"])
+            if op2 == "Gramos → Moles":
+                g = st.number_input("Masa (g)", min_value=0.0, value=18.0)
+                if st.button("Calcular", key="g3"):
+                    try:
+                        mm = _session_memo(molar_mass, formula)
+                        n = g / mm
+                        st.latex(r"n = \dfrac{m}{M}")
+                        st.success(f"Masa molar de {formula}: **{mm:.5f} g/mol**\n\n"
+                                   f"{g:.4f} g → **{n:.6f} mol**")
+                        st.caption("Dividimos la masa en gramos por la masa molar (g/mol).")
+                    except Exception as e:
+                        st.error(str(e))
+            else:
+                n = st.number_input("Cantidad (mol)", min_value=0.0, value=1.0)
+                if st.button("Calcular", key="g4"):
+                    try:
+                        mm = _session_memo(molar_mass, formula)
+                        g = n * mm
+                        st.latex(r"m = n \times M")
+                        st.success(f"Masa molar de {formula}: **{mm:.5f} g/mol**\n\n"
+                                   f"{n:.6f} mol → **{g:.5f} g**")
+                        st.caption("Multiplicamos los moles por la masa molar.")
+                    except Exception as e:
+                        st.error(str(e))
+
+        if step == "Calcular masa molar y % composición":
+            formula = _shared_formula()
+            if st.button("Calcular", key="g5"):
+                try:
+                    comp, mm = _session_memo(percent_composition, formula)
+                    st.latex(r"M = \sum (\text{masa atómica} \times \text{cantidad})")
+                    st.success(f"Masa molar de {formula}: **{mm:.5f} g/mol**")
+                    st.markdown("**Composición porcentual (aporte de cada elemento):**")
+                    for el, pct in sorted(comp.items()):
+                        st.write(f"- {el}: **{pct:.4f}%**")
+                    st.caption("Cada porcentaje indica cuánta masa del compuesto corresponde a ese elemento.")
+                except Exception as e:
+                    st.error(str(e))
+
+        if step == "Fórmula empírica desde % o masas":
+            st.info("Tip: si ingresas porcentajes que suman ~100, se asume **base 100 g**.")
+            nrows = st.number_input("¿Cuántos elementos hay?", min_value=2, max_value=8, value=3)
+            pairs = []
+            for i in range(int(nrows)):
+                c1, c2 = st.columns([1,2])
+                sym = c1.text_input(f"Símbolo {i+1}", value="CHO"[i] if i<3 else "")
+                val = c2.number_input(f"Valor {i+1} (masa en g o %)", min_value=0.0, value=[40.0,6.7,53.3][i] if i<3 else 0.0)
+                if sym:
+                    pairs.append((sym.strip(), val))
+            if st.button("Obtener fórmula empírica", key="g6"):
+                try:
+                    emp = empirical_formula_from_pairs(pairs)
+                    st.latex(r"\text{Cálculo: convertir a moles, dividir por el menor y redondear a enteros simples.}")
+                    st.success(f"Fórmula empírica: **{emp}**")
+                    st.caption("Se convierten las masas/% a moles y se buscan las proporciones más simples.")
+                except Exception as e:
+                    st.error(str(e))
+
+        if step == "Fórmula molecular desde empírica + masa molar":
+            emp_in = st.text_input("Fórmula empírica (ej: CH2O)", "CH2O")
+            target_mm = st.number_input("Masa molar objetivo (g/mol)", min_value=0.0, value=180.16)
+            if st.button("Calcular fórmula molecular", key="g7"):
+                try:
+                    mf = molecular_formula(emp_in, target_mm)
+                    st.latex(r"\text{La fórmula molecular = } k \times \text{(fórmula empírica)}")
+                    st.success(f"Fórmula molecular: **{mf}**")
+                    st.caption("Buscamos un múltiplo entero k tal que k·M(empírica) ≈ Masa molar objetivo.")
+                except Exception as e:
+                    st.error(str(e))
+
+    with tabs[0]:
+        _tab_guided()
+
+    # ---------- Tab 2: Cálculos rápidos ----------
+    @st.fragment
+    @_profile_fragment
+    def _tab_quick():
+        st.subheader("🧮 Conversor rápido")
+        conv = st.selectbox("¿Qué quieres convertir?", [
+            "Gramos → Moles",
+            "Moles → Gramos",
+            "Moles → Partículas",
+            "Partículas → Moles",
+        ])
+        if "Gramos" in conv or "Moles" in conv:
+            formula = _shared_formula()
+        if conv == "Gramos → Moles":
             g = st.number_input("Masa (g)", min_value=0.0, value=18.0)
-            if st.button("Calcular", key="g3"):
+            if st.button("Calcular", key="q1"):
                 try:
-                    mm = molar_mass(formula)
-                    n = g / mm
-                    st.latex(r"n = \dfrac{m}{M}")
-                    st.success(f"Masa molar de {formula}: **{mm:.5f} g/mol**\n\n"
-                               f"{g:.4f} g → **{n:.6f} mol**")
-                    st.caption("Dividimos la masa en gramos por la masa molar (g/mol).")
+                    mm = _session_memo(molar_mass, formula); n = g/mm
+                    st.success(f"M({formula})={mm:.5f} g/mol → **{n:.6f} mol**")
                 except Exception as e:
                     st.error(str(e))
-        else:
+        elif conv == "Moles → Gramos":
             n = st.number_input("Cantidad (mol)", min_value=0.0, value=1.0)
-            if st.button("Calcular", key="g4"):
+            if st.button("Calcular", key="q2"):
                 try:
-                    mm = molar_mass(formula)
-                    g = n * mm
-                    st.latex(r"m = n \times M")
-                    st.success(f"Masa molar de {formula}: **{mm:.5f} g/mol**\n\n"
-                               f"{n:.6f} mol → **{g:.5f} g**")
-                    st.caption("Multiplicamos los moles por la masa molar.")
+                    mm = _session_memo(molar_mass, formula); g = n*mm
+                    st.success(f"M({formula})={mm:.5f} g/mol → **{g:.5f} g**")
                 except Exception as e:
                     st.error(str(e))
-
-    if step == "Calcular masa molar y % composición":
-        formula = st.text_input("Fórmula química (ej: CuSO4·5H2O)", st.session_state.get("last_formula","C6H12O6"), key="mmf")
-        if st.button("Calcular", key="g5"):
+        elif conv == "Moles → Partículas":
+            n = st.number_input("Cantidad (mol)", min_value=0.0, value=1.0)
+            if st.button("Calcular", key="q3"):
+                st.success(f"**{n*AVOGADRO:.3e} partículas**")
+        elif conv == "Partículas → Moles":
+            p = st.number_input("Número de partículas", min_value=0.0, value=AVOGADRO)
+            if st.button("Calcular", key="q4"):
+                st.success(f"**{p/AVOGADRO:.6f} mol**")
+
+    with tabs[1]:
+        _tab_quick()
+
+    # ---------- Tab 3: Masa molar y % ----------
+    @st.fragment
+    @_profile_fragment
+    def _tab_molar_mass():
+        st.subheader("⚖️ Masa molar y composición")
+        formula2 = _shared_formula()
+        if st.button("Calcular", key="m1"):
             try:
-                comp, mm = percent_composition(formula)
-                st.latex(r"M = \sum (\text{masa atómica} \times \text{cantidad})")
-                st.success(f"Masa molar de {formula}: **{mm:.5f} g/mol**")
-                st.markdown("**Composición porcentual (aporte de cada elemento):**")
+                comp, mm = _session_memo(percent_composition, formula2)
+                st.success(f"Masa molar de {formula2}: **{mm:.5f} g/mol**")
+                st.markdown("**Composición porcentual:**")
                 for el, pct in sorted(comp.items()):
                     st.write(f"- {el}: **{pct:.4f}%**")
-                st.caption("Cada porcentaje indica cuánta masa del compuesto corresponde a ese elemento.")
             except Exception as e:
                 st.error(str(e))
 
-    if step == "Fórmula empírica desde % o masas":
-        st.info("Tip: si ingresas porcentajes que suman ~100, se asume **base 100 g**.")
-        nrows = st.number_input("¿Cuántos elementos hay?", min_value=2, max_value=8, value=3)
+    with tabs[2]:
+        _tab_molar_mass()
+
+    # ---------- Tab 4: Empírica y molecular ----------
+    @st.fragment
+    @_profile_fragment
+    def _tab_formulas():
+        st.subheader("🧩 Fórmulas empírica y molecular")
+        st.markdown("**Empírica desde % o masas**")
+        nrows = st.number_input("Cantidad de elementos", min_value=2, max_value=8, value=3, key="nrows2")
         pairs = []
         for i in range(int(nrows)):
             c1, c2 = st.columns([1,2])
-            sym = c1.text_input(f"Símbolo {i+1}", value="CHO"[i] if i<3 else "")
-            val = c2.number_input(f"Valor {i+1} (masa en g o %)", min_value=0.0, value=[40.0,6.7,53.3][i] if i<3 else 0.0)
+            sym = c1.text_input(f"Símbolo {i+1}", value="CHO"[i] if i<3 else "", key=f"s2_{i}")
+            val = c2.number_input(f"Valor {i+1} (g o %)", min_value=0.0, value=[40.0,6.7,53.3][i] if i<3 else 0.0, key=f"v2_{i}")
             if sym:
                 pairs.append((sym.strip(), val))
-        if st.button("Obtener fórmula empírica", key="g6"):
+        if st.button("Calcular empírica", key="e1"):
             try:
                 emp = empirical_formula_from_pairs(pairs)
-                st.latex(r"\text{Cálculo: convertir a moles, dividir por el menor y redondear a enteros simples.}")
-                st.success(f"Fórmula empírica: **{emp}**")
-                st.caption("Se convierten las masas/% a moles y se buscan las proporciones más simples.")
+                st.success(f"Empírica: **{emp}**")
             except Exception as e:
                 st.error(str(e))
 
-    if step == "Fórmula molecular desde empírica + masa molar":
-        emp_in = st.text_input("Fórmula empírica (ej: CH2O)", "CH2O")
-        target_mm = st.number_input("Masa molar objetivo (g/mol)", min_value=0.0, value=180.16)
-        if st.button("Calcular fórmula molecular", key="g7"):
+        st.markdown("---")
+        st.markdown("**Molecular desde empírica + masa molar**")
+        emp_in = st.text_input("Fórmula empírica", "CH2O", key="emp_in2")
+        target_mm = st.number_input("Masa molar objetivo (g/mol)", min_value=0.0, value=180.156, key="tmm2")
+        if st.button("Calcular molecular", key="e2"):
             try:
                 mf = molecular_formula(emp_in, target_mm)
-                st.latex(r"\text{La fórmula molecular = } k \times \text{(fórmula empírica)}")
-                st.success(f"Fórmula molecular: **{mf}**")
-                st.caption("Buscamos un múltiplo entero k tal que k·M(empírica) ≈ Masa molar objetivo.")
+                st.success(f"Molecular: **{mf}**")
             except Exception as e:
                 st.error(str(e))
 
-# ---------- Tab 2: Cálculos rápidos ----------
-with tabs[1]:
-    st.subheader("🧮 Conversor rápido")
-    conv = st.selectbox("¿Qué quieres convertir?", [
-        "Gramos → Moles",
-        "Moles → Gramos",
-        "Moles → Partículas",
-        "Partículas → Moles",
-    ])
-    if "Gramos" in conv or "Moles" in conv:
-        formula = st.text_input("Fórmula química", st.session_state.get("last_formula","H2O"), key="fquick")
-    if conv == "Gramos → Moles":
-        g = st.number_input("Masa (g)", min_value=0.0, value=18.0)
-        if st.button("Calcular", key="q1"):
-            try:
-                mm = molar_mass(formula); n = g/mm
-                st.success(f"M({formula})={mm:.5f} g/mol → **{n:.6f} mol**")
-            except Exception as e:
-                st.error(str(e))
-    elif conv == "Moles → Gramos":
-        n = st.number_input("Cantidad (mol)", min_value=0.0, value=1.0)
-        if st.button("Calcular", key="q2"):
-            try:
-                mm = molar_mass(formula); g = n*mm
-                st.success(f"M({formula})={mm:.5f} g/mol → **{g:.5f} g**")
-            except Exception as e:
-                st.error(str(e))
-    elif conv == "Moles → Partículas":
-        n = st.number_input("Cantidad (mol)", min_value=0.0, value=1.0)
-        if st.button("Calcular", key="q3"):
-            st.success(f"**{n*AVOGADRO:.3e} partículas**")
-    elif conv == "Partículas → Moles":
-        p = st.number_input("Número de partículas", min_value=0.0, value=AVOGADRO)
-        if st.button("Calcular", key="q4"):
-            st.success(f"**{p/AVOGADRO:.6f} mol**")
-
-# ---------- Tab 3: Masa molar y % ----------
-with tabs[2]:
-    st.subheader("⚖️ Masa molar y composición")
-    formula2 = st.text_input("Fórmula química (ej: C6H12O6, CuSO4·5H2O)", st.session_state.get("last_formula","C6H12O6"), key="f2")
-    if st.button("Calcular", key="m1"):
-        try:
-            comp, mm = percent_composition(formula2)
-            st.success(f"Masa molar de {formula2}: **{mm:.5f} g/mol**")
-            st.markdown("**Composición porcentual:**")
-            for el, pct in sorted(comp.items()):
-                st.write(f"- {el}: **{pct:.4f}%**")
-        except Exception as e:
-            st.error(str(e))
-
-# ---------- Tab 4: Empírica y molecular ----------
-with tabs[3]:
-    st.subheader("🧩 Fórmulas empírica y molecular")
-    st.markdown("**Empírica desde % o masas**")
-    nrows = st.number_input("Cantidad de elementos", min_value=2, max_value=8, value=3, key="nrows2")
-    pairs = []
-    for i in range(int(nrows)):
-        c1, c2 = st.columns([1,2])
-        sym = c1.text_input(f"Símbolo {i+1}", value="CHO"[i] if i<3 else "", key=f"s2_{i}")
-        val = c2.number_input(f"Valor {i+1} (g o %)", min_value=0.0, value=[40.0,6.7,53.3][i] if i<3 else 0.0, key=f"v2_{i}")
-        if sym:
-            pairs.append((sym.strip(), val))
-    if st.button("Calcular empírica", key="e1"):
-        try:
-            emp = empirical_formula_from_pairs(pairs)
-            st.success(f"Empírica: **{emp}**")
-        except Exception as e:
-            st.error(str(e))
-
-    st.markdown("---")
-    st.markdown("**Molecular desde empírica + masa molar**")
-    emp_in = st.text_input("Fórmula empírica", "CH2O", key="emp_in2")
-    target_mm = st.number_input("Masa molar objetivo (g/mol)", min_value=0.0, value=180.156, key="tmm2")
-    if st.button("Calcular molecular", key="e2"):
-        try:
-            mf = molecular_formula(emp_in, target_mm)
-            st.success(f"Molecular: **{mf}**")
-        except Exception as e:
-            st.error(str(e))
-
-# ---------- Tab 5: Ejemplos resueltos ----------
-with tabs[4]:
-    st.subheader("📘 Ejemplos paso a paso")
-    with st.expander("1) ¿Cuántos moles hay en 36,0 g de agua (H2O)?"):
-        try:
-            mm = molar_mass("H2O")
-            n = 36.0 / mm
-            st.write(f"M(H2O) = {mm:.4f} g/mol → **{n:.4f} mol**")
-            st.caption("Fórmula usada: n = m / M")
-        except Exception as e:
-            st.warning(str(e))
-
-    with st.expander("2) ¿Cuántas moléculas hay en 0,250 mol de CO2?"):
-        st.write(f"Moléculas = 0,250 × {AVOGADRO:.6e} = **{0.250*AVOGADRO:.3e}**")
-
-    with st.expander("3) Masa molar y % en CuSO4·5H2O"):
-        try:
-            mm = molar_mass("CuSO4·5H2O")
-            comp, _ = percent_composition("CuSO4·5H2O")
-            st.write(f"M = **{mm:.4f} g/mol**")
-            for el, pct in sorted(comp.items()):
-                st.write(f"- {el}: {pct:.4f}%")
-        except Exception as e:
-            st.warning(str(e))
-
-    with st.expander("4) Fórmula empírica desde %: C=40,00; H=6,71; O=53,29"):
-        try:
-            emp = empirical_formula_from_pairs([("C",40.00),("H",6.71),("O",53.29)])
-            st.write(f"Empírica = **{emp}** (esperada: CH2O)")
-        except Exception as e:
-            st.warning(str(e))
-
-    with st.expander("5) Fórmula molecular: empírica CH2O y masa molar 180,16 g/mol"):
-        try:
-            mf = molecular_formula("CH2O", 180.16)
-            st.write(f"Molecular = **{mf}** (glucosa)")
-        except Exception as e:
-            st.warning(str(e))
-
-st.divider()
-st.caption("Diseñada para uso en ramo Quimica aplicada a la ingenieria U.Mayor. Las masas atómicas provienen de la librería 'periodictable'.")
+    with tabs[3]:
+        _tab_formulas()
+
+    # ---------- Tab 5: Ejemplos resueltos ----------
+    # Los ejemplos usan siempre los mismos datos: se resuelven una sola vez y cada
+    # expander solo muestra el resultado guardado.
+    @st.cache_data(show_spinner=False)
+    def _solved_examples() -> dict:
+        comp_cuso4, mm_cuso4 = percent_composition("CuSO4·5H2O")
+        return {
+            "mm_h2o": molar_mass("H2O"),
+            "mm_cuso4": mm_cuso4,
+            "comp_cuso4": comp_cuso4,
+            "emp_cho": empirical_formula_from_pairs([("C",40.00),("H",6.71),("O",53.29)]),
+            "mf_glucose": molecular_formula("CH2O", 180.16),
+        }
+
+    # Con 'periodictable' disponible, los resultados quedan listos al cargar la
+    # página; sin ella, cada ejemplo muestra el aviso correspondiente.
+    _EXAMPLES_SOLVED = _solved_examples() if pt is not None else None
+
+    @st.fragment
+    @_profile_fragment
+    def _tab_examples():
+        st.subheader("📘 Ejemplos paso a paso")
+        ex = _EXAMPLES_SOLVED
+        with st.expander("1) ¿Cuántos moles hay en 36,0 g de agua (H2O)?"):
+            if ex is None:
+                st.warning(_PT_MISSING)
+            else:
+                mm = ex["mm_h2o"]
+                st.write(f"M(H2O) = {mm:.4f} g/mol → **{36.0 / mm:.4f} mol**")
+                st.caption("Fórmula usada: n = m / M")
+
+        with st.expander("2) ¿Cuántas moléculas hay en 0,250 mol de CO2?"):
+            st.write(f"Moléculas = 0,250 × {AVOGADRO:.6e} = **{0.250*AVOGADRO:.3e}**")
+
+        with st.expander("3) Masa molar y % en CuSO4·5H2O"):
+            if ex is None:
+                st.warning(_PT_MISSING)
+            else:
+                st.write(f"M = **{ex['mm_cuso4']:.4f} g/mol**")
+                for el, pct in sorted(ex["comp_cuso4"].items()):
+                    st.write(f"- {el}: {pct:.4f}%")
+
+        with st.expander("4) Fórmula empírica desde %: C=40,00; H=6,71; O=53,29"):
+            if ex is None:
+                st.warning(_PT_MISSING)
+            else:
+                st.write(f"Empírica = **{ex['emp_cho']}** (esperada: CH2O)")
+
+        with st.expander("5) Fórmula molecular: empírica CH2O y masa molar 180,16 g/mol"):
+            if ex is None:
+                st.warning(_PT_MISSING)
+            else:
+                st.write(f"Molecular = **{ex['mf_glucose']}** (glucosa)")
+
+    with tabs[4]:
+        _tab_examples()
+
+    st.divider()
+    st.caption("Diseñada para uso en ramo Quimica aplicada a la ingenieria U.Mayor. Las masas atómicas provienen de la librería 'periodictable'.")
+finally:
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
@@ -0,0 +1,47 @@
+import numpy as np
+
+# 'numba' es opcional: si está, la búsqueda se compila a código nativo (la
+# primera vez queda en caché en disco). Vive en este módulo y no en la app
+# porque Streamlit vuelve a ejecutar el script en cada interacción: aquí se
+# importa una sola vez por proceso, con un nombre de módulo estable para la
+# caché de numba.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+K_CANDIDATES = np.array([1, 2, 3, 4, 5, 6, 8, 10])
+
+# Busca el menor multiplicador k que deja todos los cocientes casi enteros y
+# sin ceros. Devuelve (k, enteros redondeados), con k = 0 si ninguno sirve.
+def find_k(ratios, tol):
+    # Se prueban todos los k a la vez, una columna por cada uno.
+    X = ratios[:, None] * K_CANDIDATES[None, :]
+    N = np.rint(X)
+    err = np.max(np.abs(X - N), axis=0)
+    zeros = np.any(N == 0, axis=0)
+    ok = (err <= tol) & ~zeros
+    if not ok.any():
+        return 0, np.zeros(len(ratios), dtype=np.int64)
+    j = np.argmax(ok)
+    return int(K_CANDIDATES[j]), N[:, j].astype(np.int64)
+
+if njit is not None:
+    # Misma búsqueda con bucles simples, que numba compila mejor que la versión vectorizada.
+    @njit(cache=True)
+    def _find_k_njit(ratios, tol):
+        rounded = np.zeros(len(ratios), dtype=np.int64)
+        for k in K_CANDIDATES:
+            ok = True
+            for i in range(len(ratios)):
+                x = ratios[i] * k
+                n = np.rint(x)
+                if n == 0 or abs(x - n) > tol:
+                    ok = False
+                    break
+                rounded[i] = int(n)
+            if ok:
+                return int(k), rounded
+        return 0, rounded
+
+    find_k = _find_k_njit